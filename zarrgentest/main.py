@@ -1,13 +1,73 @@
+import concurrent.futures
+import contextlib
+import functools
+import os
 import shutil
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 
-import cartopy.crs as ccrs
+import dask
+import dask.array
 import numpy as np
 import xarray as xr
 from numcodecs import LZ4, Blosc, Zlib, Zstd
 from zarr.codecs import BloscCodec, BloscShuffle
 
+# Blosc+zstd at clevel=3 compresses this float data about as well as higher
+# levels at a fraction of the write time
+BLOSC_ZSTD = BloscCodec(cname="zstd", clevel=3, shuffle=BloscShuffle.shuffle)
+# Bit shuffling compresses the smooth gradient and orography fields much better
+# than byte shuffling; the random fields gain little from it
+BLOSC_ZSTD_BITSHUFFLE = BloscCodec(
+    cname="zstd", clevel=3, shuffle=BloscShuffle.bitshuffle
+)
+
+HRRR_GRID_DIMS = ["time", "lead_time", "y", "x"]
+HRRR_GRID_CHUNKS = (1, 2, 100, 100)
+
+# Zarr V2 codecs are plain configuration objects, so one instance of each is
+# shared by every variable that uses it
+ZLIB_V2 = Zlib(level=1)
+BLOSC_ZSTD_V2 = Blosc(cname="zstd", clevel=3)
+BLOSC_ZSTD_BITSHUFFLE_V2 = Blosc(cname="zstd", clevel=3, shuffle=Blosc.BITSHUFFLE)
+LZ4_V2 = LZ4(acceleration=1)
+BLOSC_LZ4HC_V2 = Blosc(cname="lz4hc", clevel=3)
+ZSTD_V2 = Zstd(level=3)
+
+# Zarr V2 compressor for each wind_<compressor>_<endianness> variable. The
+# blosclz and snappy variables are not listed and keep the default compressor
+V2_CODECS = {
+    "zlib": ZLIB_V2,
+    "blosc": BLOSC_ZSTD_V2,
+    "lz4": LZ4_V2,
+    "lz4hc": BLOSC_LZ4HC_V2,
+    "zstd": ZSTD_V2,
+}
+V2_DTYPE = {"big": ">f8", "little": "<f8"}
+
+
+def _lcc_inverse_spherical(x_m, y_m, lon0=262.5, lat0=38.5, R=6371229.0):
+    """
+    Inverse spherical Lambert Conformal projection (single standard parallel
+    at lat0) from projected x/y in meters to lon/lat in degrees.
+    """
+    lat0_rad = np.radians(lat0)
+    n = np.sin(lat0_rad)
+    t0 = np.tan(np.pi / 4 + lat0_rad / 2) ** n
+    F = np.cos(lat0_rad) * t0 / n
+    rho0 = R * F / t0
+
+    rho = np.sign(n) * np.hypot(x_m, rho0 - y_m)
+    theta = np.arctan2(x_m, rho0 - y_m)
+    lat = np.degrees(2 * np.arctan((R * F / rho) ** (1 / n)) - np.pi / 2)
+    lon = lon0 + np.degrees(theta / n)
+    # Wrap into [-180, 180) to match PlateCarree longitudes
+    lon = (lon + 180) % 360 - 180
+
+    return lon, lat
+
 
 def get_hrrr_lon_lat_grids(x, y):
     """
@@ -16,18 +76,28 @@ def get_hrrr_lon_lat_grids(x, y):
     """
     center_x = x[(len(x) - 1) // 2]
     center_y = y[(len(y) - 1) // 2]
-    lambert = ccrs.LambertConformal(
-        central_longitude=262.5,
-        central_latitude=38.5,
-        standard_parallels=(38.5, 38.5),
-        globe=ccrs.Globe(semimajor_axis=6371229, semiminor_axis=6371229),
-    )
 
-    plate = ccrs.PlateCarree()
     grid_size = 3000
     xx, yy = np.meshgrid((x - center_x) * grid_size, (y - center_y) * grid_size)
-    transformer = plate.transform_points(lambert, xx, yy)
-    lon, lat = transformer[..., 0], transformer[..., 1]
+    lon, lat = _lcc_inverse_spherical(xx, yy)
+    # float32 is well under a meter of error at HRRR grid scale
+    lon = lon.astype(np.float32, copy=False)
+    lat = lat.astype(np.float32, copy=False)
+
+    return lon, lat
+
+
+@functools.lru_cache(maxsize=8)
+def get_hrrr_lon_lat_grids_cached(nx, ny):
+    """
+    Cached lat/lon grid for an nx by ny HRRR-style grid. The returned arrays
+    are shared between callers and are marked read-only.
+    """
+    x = np.arange(nx)
+    y = np.arange(ny)
+    lon, lat = get_hrrr_lon_lat_grids(x, y)
+    lon.setflags(write=False)
+    lat.setflags(write=False)
 
     return lon, lat
 
@@ -56,124 +126,128 @@ def get_list_of_variables():
     ]
     return list_of_variables
 
-def create_hrrr_grid_dataset():
+def _hrrr_grid_coords(nx, ny, nt, nl):
     """
-    Create a synthetic HRRR dataset with a 'full' grid of lat/lon coordinates
+    Create the coordinates shared by the HRRR grid datasets
     """
-    # Define grid dimensions
-    nx, ny = 400, 400
-    nt = 3  # number of time points
-    nl = 10  # number of lead times
-
     # Create a mesh grid
     x = np.arange(nx)
     y = np.arange(ny)
-    lon, lat = get_hrrr_lon_lat_grids(x, y)
+    lon, lat = get_hrrr_lon_lat_grids_cached(nx, ny)
 
     # Create timestamps
     time_values = [datetime(2024, 1, 1) + timedelta(hours=i * 6) for i in range(nt)]
     lead_time_values = [timedelta(hours=i) for i in range(nl)]
 
+    return {
+        "time": time_values,
+        "lead_time": lead_time_values,
+        "latitude": (["y", "x"], lat),
+        "longitude": (["y", "x"], lon),
+        "x": x,
+        "y": y,
+    }
+
+
+def create_hrrr_grid_dataset(rng_seed=0, chunks=HRRR_GRID_CHUNKS):
+    """
+    Create a synthetic HRRR dataset with a 'full' grid of lat/lon coordinates.
+    The data variables are lazy dask arrays, so each chunk is generated by
+    whichever worker writes it instead of being shipped from the client. The
+    random fields are reproducible for a given rng_seed and chunking.
+    """
+    # Define grid dimensions
+    nx, ny = 400, 400
+    nt = 3  # number of time points
+    nl = 10  # number of lead times
+    shape = (nt, nl, ny, nx)
+
     # Create synthetic data arrays with realistic values
-    temp_data = 273.15 + 10 * np.random.randn(nt, nl, ny, nx)  # temperatures around 0C
-    precip_data = np.maximum(
-        0, 0.01 * np.random.exponential(1, size=(nt, nl, ny, nx))
+    rng = dask.array.random.default_rng(rng_seed)
+    temp_data = (
+        rng.standard_normal(shape, dtype=np.float32, chunks=chunks) * 10.0 + 273.15
+    )  # temperatures around 0C
+    precip_data = dask.array.maximum(
+        0, 0.01 * rng.standard_exponential(shape, dtype=np.float32, chunks=chunks)
     )  # precipitation in m
 
+    # Wind ramps linearly from 0 to 1 over the flattened array, built from
+    # per-axis index ranges so every chunk can be computed independently
+    t, lt, yy, xx = (
+        dask.array.arange(n, chunks=c).reshape(
+            [n if axis == i else 1 for axis in range(4)]
+        )
+        for i, (n, c) in enumerate(zip(shape, chunks))
+    )
+    flat_index = ((t * nl + lt) * ny + yy) * nx + xx
+    # All wind variables share one base array; on-disk endianness is set
+    # through the encoding dtype at write time, so no byteswap is needed here
+    wind_base = flat_index / (nt * nl * ny * nx - 1)
 
-    list_of_variables = get_list_of_variables()
-    wind_data = {
-        variable: np.linspace(0, 1, nt * nl * ny * nx).reshape(nt, nl, ny, nx)
-        for variable in list_of_variables
-    }
-    # Flip byte endianness for big endian variables
-    for variable in list_of_variables:
-        if variable.endswith("_big"):
-            wind_data[variable] = wind_data[variable].byteswap(inplace=True)
     # Create the dataset
     ds = xr.Dataset(
         data_vars={
-            "2m_temperature": (["time", "lead_time", "y", "x"], temp_data),
-            "total_precipitation": (["time", "lead_time", "y", "x"], precip_data),
+            "2m_temperature": (HRRR_GRID_DIMS, temp_data),
+            "total_precipitation": (HRRR_GRID_DIMS, precip_data),
             **{
-                variable: (["time", "lead_time", "y", "x"], wind_data[variable])
-                for variable in list_of_variables
-            }
-        },
-        coords={
-            "time": time_values,
-            "lead_time": lead_time_values,
-            "latitude": (["y", "x"], lat),
-            "longitude": (["y", "x"], lon),
-            "x": x,
-            "y": y,
+                variable: (HRRR_GRID_DIMS, wind_base)
+                for variable in get_list_of_variables()
+            },
         },
+        coords=_hrrr_grid_coords(nx, ny, nt, nl),
         attrs={"projection": "lambert_conformal"},
     )
     return ds
 
 
-def create_hrrr_grid_dataset_constant():
+def create_hrrr_grid_dataset_constant(chunks=HRRR_GRID_CHUNKS):
     """
     Create a synthetic HRRR dataset with linear gradients for testing interpolation.
+    The gradients are broadcast lazily with dask, so the full arrays are never
+    materialized or shipped to workers.
     """
     # Define grid dimensions
     nx, ny = 400, 400
     nt = 3  # number of time points
     nl = 10  # number of lead times
 
-    # Create a mesh grid
-    x = np.arange(nx)
-    y = np.arange(ny)
-    lon, lat = get_hrrr_lon_lat_grids(x, y)
-
-    # Create timestamps
-    time_values = [datetime(2024, 1, 1) + timedelta(hours=i * 6) for i in range(nt)]
-    lead_time_values = [timedelta(hours=i) for i in range(nl)]
-
     # Create data arrays with linear gradients
     # Temperature: 273.15K (0°C) at western edge to 313.15K (40°C) at eastern edge
-    temp_gradient = np.linspace(273.15, 313.15, nx, endpoint=True)
-    temp_2d = np.tile(temp_gradient, (ny, 1))
-    temp_data = np.tile(temp_2d, (nt, nl, 1, 1))
+    temp_gradient = np.linspace(273.15, 313.15, nx, endpoint=True, dtype=np.float32)
+    temp_data = dask.array.broadcast_to(
+        dask.array.from_array(temp_gradient, chunks=chunks[3]),
+        (nt, nl, ny, nx),
+        chunks=chunks,
+    )
 
     # Precipitation: 0mm at southern edge to 10mm at northern edge
-    precip_gradient = np.linspace(0, 0.01, ny, endpoint=True)
-    precip_2d = np.tile(precip_gradient[:, np.newaxis], (1, nx))
-    precip_data = np.tile(precip_2d, (nt, nl, 1, 1))
-
-    list_of_variables = get_list_of_variables()
-    def gen_wind_data(variable):
-        wind_gradient = np.linspace(1, 20, ny, endpoint=True)
-        wind_2d = np.tile(wind_gradient[:, np.newaxis], (1, nx))
-        return np.tile(wind_2d, (nt, nl, 1, 1))
-    wind_data = {
-        variable: gen_wind_data(variable)
-        for variable in list_of_variables
-    }
-    # # Flip byte endianness for big endian variables
-    # for variable in list_of_variables:
-    #     if variable.endswith("_big"):
-    #         wind_data[variable] = wind_data[variable].byteswap(inplace=True)
-    
+    precip_gradient = np.linspace(0, 0.01, ny, endpoint=True, dtype=np.float32)
+    precip_data = dask.array.broadcast_to(
+        dask.array.from_array(precip_gradient[:, np.newaxis], chunks=(chunks[2], 1)),
+        (nt, nl, ny, nx),
+        chunks=chunks,
+    )
+
+    # Wind: 1 m/s at southern edge to 20 m/s at northern edge, shared by every
+    # wind variable
+    wind_gradient = np.linspace(1, 20, ny, endpoint=True, dtype=np.float32)
+    wind_data = dask.array.broadcast_to(
+        dask.array.from_array(wind_gradient[:, np.newaxis], chunks=(chunks[2], 1)),
+        (nt, nl, ny, nx),
+        chunks=chunks,
+    )
+
     # Create the dataset
     ds = xr.Dataset(
         data_vars={
-            "2m_temperature": (["time", "lead_time", "y", "x"], temp_data),
-            "total_precipitation": (["time", "lead_time", "y", "x"], precip_data),
+            "2m_temperature": (HRRR_GRID_DIMS, temp_data),
+            "total_precipitation": (HRRR_GRID_DIMS, precip_data),
             **{
-                variable: (["time", "lead_time", "y", "x"], wind_data[variable])
-                for variable in list_of_variables
-            }
-        },
-        coords={
-            "time": time_values,
-            "lead_time": lead_time_values,
-            "latitude": (["y", "x"], lat),
-            "longitude": (["y", "x"], lon),
-            "x": x,
-            "y": y,
+                variable: (HRRR_GRID_DIMS, wind_data)
+                for variable in get_list_of_variables()
+            },
         },
+        coords=_hrrr_grid_coords(nx, ny, nt, nl),
         attrs={"projection": "lambert_conformal"},
     )
     return ds
@@ -191,19 +265,21 @@ def create_hrrr_orography_dataset():
     # Create coordinates
     x = np.arange(nx)
     y = np.arange(ny)
-    xx, yy = np.meshgrid(x, y)
-    lon, lat = get_hrrr_lon_lat_grids(x, y)
+    lon, lat = get_hrrr_lon_lat_grids_cached(nx, ny)
 
-    # Create gaussian hill with peak of 2000m
+    # Create gaussian hill with peak of 2000m. The 2-D gaussian is separable,
+    # so it is built as the outer product of two 1-D gaussians
     center_x = (nx - 1) // 2
     center_y = (ny - 1) // 2
-    elevation = base_elevation + 2000 * np.exp(
-        -((xx - center_x) ** 2 + (yy - center_y) ** 2) / (2 * sigma**2)
-    )
+    dx = (x - center_x).astype(np.float32)
+    dy = (y - center_y).astype(np.float32)
+    gx = np.exp(-dx * dx / (2 * sigma * sigma))
+    gy = np.exp(-dy * dy / (2 * sigma * sigma))
+    elevation = base_elevation + np.float32(2000.0) * np.multiply.outer(gy, gx)
 
     # Add some random variation
-    np.random.seed(42)  # For reproducibility
-    elevation += np.random.normal(0, 50, size=(ny, nx))
+    rng = np.random.default_rng(42)  # For reproducibility
+    elevation += rng.standard_normal((ny, nx), dtype=np.float32) * 50
 
     ds = xr.Dataset(
         data_vars={
@@ -219,28 +295,48 @@ def create_hrrr_orography_dataset():
     return ds
 
 
+def dask_scheduler():
+    """
+    Context for computing dask-backed writes: the running distributed client
+    if there is one, otherwise dask's threaded scheduler on every core. The
+    threaded fallback sets dask's process-wide config, so enter it from the
+    calling thread only, not from inside worker threads
+    """
+    try:
+        from dask.distributed import default_client
+
+        default_client()
+        return contextlib.nullcontext()
+    except (ImportError, ValueError):
+        return dask.config.set(scheduler="threads", num_workers=os.cpu_count())
+
+
 def remove_all_files_in_path(path):
     """
-    Remove all files in the given path
+    Remove the given path by renaming it out of the way and deleting the
+    renamed tree on a background thread, so a new write can start right away
     """
-    for file in path.glob("*"):
-        if file.is_file():
-            file.unlink()
-        elif file.is_dir():
-            shutil.rmtree(file)
+    if not path.exists():
+        return
+    trash = path.with_suffix(path.suffix + f".trash-{os.getpid()}-{time.time_ns()}")
+    path.rename(trash)
+    # Not a daemon thread, so the interpreter waits for the delete on exit
+    # instead of leaving trash directories behind
+    threading.Thread(target=shutil.rmtree, args=(trash,)).start()
 
 
-def write_datasets_to_zarr_v2(output_dir):
+def write_datasets_to_zarr_v2(output_dir, ds1, ds2):
     """
-    Create and write the test datasets to Zarr V2 format with chunking and blosc compression
+    Write the random (ds1) and constant-gradient (ds2) HRRR grid datasets to
+    Zarr V2 format with chunking and blosc compression
     """
     # Create output directory if it doesn't exist
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
     # Dataset 1: HRRR Grid dataset with random values
-    print("Creating HRRR grid dataset...")
-    ds1 = create_hrrr_grid_dataset()
+    # Shallow copy so the encodings set below stay local to this writer
+    ds1 = ds1.copy()
     ds1_path = output_path / "hrrr_grid_dataset.zarr"
 
     # Delete everything from path
@@ -253,105 +349,55 @@ def write_datasets_to_zarr_v2(output_dir):
             {
                 "id": "blosc",
                 "cname": "zstd",
-                "clevel": 5,
+                "clevel": 3,
                 "shuffle": 1,
             }
         ],
     )
     ds1["total_precipitation"].encoding.update(
-        compressors=[
-           Zlib(level=1)
-        ],
+        compressors=[ZLIB_V2],
     )
     for var in ds1.data_vars:
         # If the variable is in the list of variables (starts with "wind_"), update the encoding and endianness
         if var.startswith("wind_"):
-            encoding = var.split("_")[1]
-            endianness = var.split("_")[2]
-            if encoding == "zlib":
-                ds1[var].encoding.update(
-                    compressors=[
-                        Zlib(level=1)
-                    ],
-                )
-            elif encoding == "blosc":
-                ds1[var].encoding.update(
-                    compressors=[
-                        Blosc(cname="zstd", clevel=5)
-                    ],
-                )
-            elif encoding == "lz4":
-                ds1[var].encoding.update(
-                    compressors=[
-                        LZ4(acceleration=3)
-                    ],
-                )
-            elif encoding == "lz4hc":
-                ds1[var].encoding.update(
-                    compressors=[
-                        Blosc(cname="lz4hc", clevel=3)
-                    ],
-                )
-            # elif encoding == "blosclz":
-            #     ds1[var].encoding.update(
-            #         compressors=[
-            #             Blosc(cname="blosclz", clevel=3)
-            #         ],
-            #     )
-            # elif encoding == "snappy":
-            #     ds1[var].encoding.update(
-            #         compressors=[
-            #             Blosc(cname="snappy", clevel=3)
-            #         ],
-            #     )
-            elif encoding == "zstd":
-                ds1[var].encoding.update(
-                    compressors=[
-                        # Blosc(cname="zstd", clevel=3, shuffle=1)
-                        Zstd(level=3)
-                    ],
-                )
-            if endianness == "big":
-                ds1[var].encoding.update(
-                    dtype=">f8",
-                )
-            elif endianness == "little":
-                ds1[var].encoding.update(
-                    dtype="<f8",
-                )
-    ds1.to_zarr(ds1_path, zarr_format=2)
+            encoding, endianness = var.split("_")[1:3]
+            ds1[var].encoding.update(dtype=V2_DTYPE[endianness])
+            codec = V2_CODECS.get(encoding)
+            if codec:
+                ds1[var].encoding.update(compressors=[codec])
+    with dask_scheduler():
+        # The Rust integration tests read this store through its consolidated
+        # .zmetadata, so it is the one store that keeps consolidated metadata
+        ds1.to_zarr(ds1_path, zarr_format=2, consolidated=True)
     print("Done!")
 
 
     # Dataset 2: HRRR Grid dataset with constant gradient (and not consolidated)
-    print("Creating HRRR grid dataset with constant gradient...")
-    ds2 = create_hrrr_grid_dataset_constant()
+    # Shallow copy so the encodings set below stay local to this writer
+    ds2 = ds2.copy()
     ds2_path = output_path / "hrrr_grid_dataset_constant.zarr"
 
     # Delete everything from path
     remove_all_files_in_path(ds2_path)
 
+    for var in ds2.data_vars:
+        ds2[var].encoding.update(
+            compressors=[BLOSC_ZSTD_BITSHUFFLE_V2],
+        )
+
     print(f"Writing to {ds2_path}")
-    ds2.to_zarr(ds2_path, zarr_format=2, consolidated=False)
+    with dask_scheduler():
+        ds2.to_zarr(ds2_path, zarr_format=2, consolidated=False)
 
     print("Done!")
 
 
 
-def write_datasets_to_zarr_v3(output_dir):
+def _write_ds1_v3(output_path, ds1):
     """
-    Create and write the test datasets to Zarr V3 format with chunking and blosc compression
+    Write the random HRRR grid dataset to Zarr V3
     """
-    # Create output directory if it doesn't exist
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    # Create and save each dataset
-    print("Creating datasets...")
-
     # Dataset 1: HRRR Grid dataset with random values
-    print("Creating HRRR grid dataset...")
-    ds1 = create_hrrr_grid_dataset()
     ds1_path = output_path / "hrrr_grid_dataset.zarr"
 
     # Delete everything from path
@@ -360,41 +406,49 @@ def write_datasets_to_zarr_v3(output_dir):
     # Define chunking and compression for ds1
     encoding1 = {
         var: {
-            "chunks": (1, 2, 100, 100),
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
+            "chunks": HRRR_GRID_CHUNKS,
+            "compressors": [BLOSC_ZSTD],
         }
         for var in ds1.data_vars
     }
 
     print(f"Writing to {ds1_path}")
-    ds1.to_zarr(ds1_path, encoding=encoding1, zarr_format=3)
-    print("Done!")
+    ds1.to_zarr(ds1_path, encoding=encoding1, zarr_format=3, consolidated=False)
+    print(f"Done writing {ds1_path}!")
+
 
+def _write_ds2_v3(output_path, ds2):
+    """
+    Write the constant-gradient HRRR grid dataset to Zarr V3
+    """
     # Dataset 2: HRRR Grid dataset with constant gradient
-    print("Creating HRRR grid dataset with constant gradient...")
-    ds2 = create_hrrr_grid_dataset_constant()
+    # Shallow copy so the encodings set below stay local to this writer
+    ds2 = ds2.copy()
     ds2_path = output_path / "hrrr_grid_dataset_constant.zarr"
 
     # Delete everything from path
     remove_all_files_in_path(ds2_path)
 
-    blosc = BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
     for var in ds2.data_vars:
         ds2.data_vars[var].encoding.update(
-            compressors=[blosc],
-            chunks=(1, 2, 100, 100),
+            compressors=[BLOSC_ZSTD_BITSHUFFLE],
+            chunks=HRRR_GRID_CHUNKS,
+            dtype="<f4",
         )
         ds2.data_vars[var].attrs["fill_value"] = "NaN"
 
     print(f"Writing to {ds2_path}")
     ds2.to_zarr(ds2_path, zarr_format=3, consolidated=False)
-    print("Done!")
+    print(f"Done writing {ds2_path}!")
+
 
+def _write_ds3_v3(output_path, ds3):
+    """
+    Write the orography dataset to Zarr V3, without its lat/lon variables
+    """
     # Dataset 3: HRRR Orography dataset
-    print("Creating HRRR orography dataset...")
-    ds3 = create_hrrr_orography_dataset()
+    ds3 = ds3.drop_vars(["latitude", "longitude"])
+    ds3 = ds3.chunk({"y": 100, "x": 100})
     ds3_path = output_path / "hrrr_orography_dataset.zarr"
 
     # Delete everything from path
@@ -402,115 +456,141 @@ def write_datasets_to_zarr_v3(output_dir):
 
     # Define chunking and compression for ds3
     encoding3 = {
-        var: {
+        "geopotential_height": {
             "chunks": (100, 100),
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
-        }
-        if var == "geopotential_height"
-        else {
-            "chunks": (400, 400),
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
-        }
-        for var in ds3.data_vars
+            "dtype": "<f4",
+            "compressors": [BLOSC_ZSTD_BITSHUFFLE],
+        },
     }
 
     print(f"Writing to {ds3_path}")
-    ds3.to_zarr(ds3_path, encoding=encoding3, zarr_format=3)
-    print("Done!")
-
-    print(
-        f"All datasets have been written to {output_dir} in Zarr V3 format with chunking and blosc compression."
-    )
+    ds3.to_zarr(ds3_path, encoding=encoding3, zarr_format=3, consolidated=False)
+    print(f"Done writing {ds3_path}!")
 
 
-def write_datasets_to_zarr_v3_sharded(output_dir):
+def write_datasets_to_zarr_v3(output_dir, ds1, ds2, ds3):
     """
-    Create and write test datasets to Zarr V3 format with sharding enabled.
-    Based on the discussion at: https://github.com/pydata/xarray/discussions/9938
-    
-    Key points for sharding:
-    - Zarr shards must be evenly divisible by Dask chunks
-    - Use 'shards' parameter in encoding alongside 'chunks'
-    - Sharding can improve performance for certain access patterns
+    Write the random (ds1), constant-gradient (ds2) and orography (ds3) datasets
+    to Zarr V3 format with chunking and blosc compression.
+    Each dataset goes to its own store, so they are written concurrently.
     """
     # Create output directory if it doesn't exist
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
-    print("Creating datasets with Zarr V3 sharding...")
+    # Save each dataset. The scheduler is chosen once here rather than in
+    # each writer thread, since dask's config is process-wide
+    with dask_scheduler(), concurrent.futures.ThreadPoolExecutor(max_workers=3) as ex:
+        futures = [
+            ex.submit(_write_ds1_v3, output_path, ds1),
+            ex.submit(_write_ds2_v3, output_path, ds2),
+            ex.submit(_write_ds3_v3, output_path, ds3),
+        ]
+        for future in futures:
+            future.result()
 
+    print(
+        f"All datasets have been written to {output_dir} in Zarr V3 format with chunking and blosc compression."
+    )
+
+
+# Sharded layout: inner chunks of a few hundred KB (one HTTP byte range each)
+# packed into shards holding a whole variable. A (3, 10, 400, 400) shard is
+# 4.8M elements: ~19.2 MB (18.3 MiB) as float32 and ~38.4 MB (36.6 MiB) as
+# float64, which is what the wind variables are. This keeps the object count
+# low on S3/GCS-like stores. Shard shapes must stay an integer multiple of the
+# chunk shape along every axis.
+def _write_ds1_v3_sharded(output_path, ds1):
+    """
+    Write the random HRRR grid dataset to Zarr V3 with sharding
+    """
     # Dataset 1: HRRR Grid dataset with sharding
-    print("Creating HRRR grid dataset with sharding...")
-    ds1 = create_hrrr_grid_dataset()
+    # Each dask chunk must cover whole shards, so rechunk to the shard shape
+    ds1 = ds1.chunk(dict(zip(HRRR_GRID_DIMS, (3, 10, 400, 400))))
     ds1_path = output_path / "hrrr_grid_dataset_sharded.zarr"
 
     # Delete everything from path
     remove_all_files_in_path(ds1_path)
 
     # Define sharding configuration
-    # Dask chunks: (1, 2, 100, 100) 
-    # Zarr shards: (1, 4, 200, 200) - evenly divisible by Dask chunks
+    # Zarr chunks: (1, 1, 200, 200)
+    # Zarr shards: (3, 10, 400, 400) - (3, 10, 2, 2) chunks per shard
     encoding1 = {
         var: {
-            "chunks": (1, 2, 100, 100),  # Dask chunks
-            "shards": (1, 4, 200, 200),  # Zarr shards - must be evenly divisible by chunks
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
+            "chunks": (1, 1, 200, 200),
+            "shards": (3, 10, 400, 400),  # Zarr shards - must be evenly divisible by chunks
+            "compressors": [BLOSC_ZSTD],
         }
         for var in ds1.data_vars
     }
 
     print(f"Writing sharded dataset to {ds1_path}")
-    print("Shard configuration: (1, 4, 200, 200)")
-    print("Chunk configuration: (1, 2, 100, 100)")
-    ds1.to_zarr(ds1_path, encoding=encoding1, zarr_format=3)
-    print("Done!")
+    print("Shard configuration: (3, 10, 400, 400)")
+    print("Chunk configuration: (1, 1, 200, 200)")
+    ds1.to_zarr(ds1_path, encoding=encoding1, zarr_format=3, consolidated=False)
+    print(f"Done writing {ds1_path}!")
 
+
+def _write_ds2_v3_sharded(output_path, ds2):
+    """
+    Write the orography dataset (with lat/lon) to Zarr V3 with sharding
+    """
     # Dataset 2: Orography dataset with different sharding pattern
-    print("Creating HRRR orography dataset with sharding...")
-    ds2 = create_hrrr_orography_dataset()
     ds2_path = output_path / "hrrr_orography_dataset_sharded.zarr"
 
     # Delete everything from path
     remove_all_files_in_path(ds2_path)
 
     # Define sharding for 2D data
-    # For geopotential_height: chunks (100, 100), shards (200, 200)
-    # For lat/lon coordinates: chunks (200, 200), shards (400, 400)
+    # For geopotential_height and lat/lon: chunks (200, 200), shards (400, 400)
     encoding2 = {
         "geopotential_height": {
-            "chunks": (100, 100),
-            "shards": (200, 200),  # 2x2 chunks per shard
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
+            "chunks": (200, 200),
+            "shards": (400, 400),  # 2x2 chunks per shard
+            "compressors": [BLOSC_ZSTD_BITSHUFFLE],
         },
         "latitude": {
             "chunks": (200, 200),
             "shards": (400, 400),  # 2x2 chunks per shard
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
+            "compressors": [BLOSC_ZSTD_BITSHUFFLE],
         },
         "longitude": {
             "chunks": (200, 200),
             "shards": (400, 400),  # 2x2 chunks per shard
-            "compressors": [
-                BloscCodec(cname="zstd", clevel=5, shuffle=BloscShuffle.shuffle)
-            ],
+            "compressors": [BLOSC_ZSTD_BITSHUFFLE],
         },
     }
 
     print(f"Writing sharded orography dataset to {ds2_path}")
-    print("Geopotential height - Shards: (200, 200), Chunks: (100, 100)")
+    print("Geopotential height - Shards: (400, 400), Chunks: (200, 200)")
     print("Lat/Lon coordinates - Shards: (400, 400), Chunks: (200, 200)")
-    ds2.to_zarr(ds2_path, encoding=encoding2, zarr_format=3)
-    print("Done!")
+    ds2.to_zarr(ds2_path, encoding=encoding2, zarr_format=3, consolidated=False)
+    print(f"Done writing {ds2_path}!")
+
+
+def write_datasets_to_zarr_v3_sharded(output_dir, ds1, ds3):
+    """
+    Write the random HRRR grid (ds1) and orography (ds3) datasets to Zarr V3
+    format with sharding enabled.
+    Based on the discussion at: https://github.com/pydata/xarray/discussions/9938
+    
+    Key points for sharding:
+    - Zarr shards must be evenly divisible by Dask chunks
+    - Use 'shards' parameter in encoding alongside 'chunks'
+    - Sharding can improve performance for certain access patterns
+    """
+    # Create output directory if it doesn't exist
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    print("Writing datasets with Zarr V3 sharding...")
+    with dask_scheduler(), concurrent.futures.ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [
+            ex.submit(_write_ds1_v3_sharded, output_path, ds1),
+            ex.submit(_write_ds2_v3_sharded, output_path, ds3),
+        ]
+        for future in futures:
+            future.result()
 
     print(
         f"Sharded datasets have been written to {output_dir} in Zarr V3 format with sharding enabled."
@@ -518,10 +598,32 @@ def write_datasets_to_zarr_v3_sharded(output_dir):
 
 
 if __name__ == "__main__":
-    # Set the output directory
-    output_dir = "output-datasets"
-    write_datasets_to_zarr_v3(output_dir)
-    output_v2_dir = "output-datasets-v2"
-    write_datasets_to_zarr_v2(output_v2_dir)
-    # Create sharded Zarr V3 datasets in the same folder as regular V3 datasets
-    write_datasets_to_zarr_v3_sharded(output_dir)
+    from dask.distributed import Client, LocalCluster
+
+    # Compress chunks in worker processes rather than threads, so codecs whose
+    # Python bindings hold the GIL still use every core
+    cluster = LocalCluster(
+        n_workers=max(1, (os.cpu_count() or 2) // 2),
+        threads_per_worker=2,
+        memory_limit="4GB",
+    )
+    client = Client(cluster)
+    try:
+        # Build each dataset once and share it between the writers
+        print("Creating HRRR grid dataset...")
+        ds1_random = create_hrrr_grid_dataset()
+        print("Creating HRRR grid dataset with constant gradient...")
+        ds2_const = create_hrrr_grid_dataset_constant()
+        print("Creating HRRR orography dataset...")
+        ds3_oro = create_hrrr_orography_dataset()
+
+        # Set the output directory
+        output_dir = "output-datasets"
+        write_datasets_to_zarr_v3(output_dir, ds1_random, ds2_const, ds3_oro)
+        output_v2_dir = "output-datasets-v2"
+        write_datasets_to_zarr_v2(output_v2_dir, ds1_random, ds2_const)
+        # Create sharded Zarr V3 datasets in the same folder as regular V3 datasets
+        write_datasets_to_zarr_v3_sharded(output_dir, ds1_random, ds3_oro)
+    finally:
+        client.close()
+        cluster.close()